@@ -1,67 +1,266 @@
 import json, requests, time, os, re
+from collections import deque
+from dataclasses import dataclass
+from functools import partial
 from datetime import datetime, timedelta, timezone
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
+
+# ✅ Lexbor（C 的 HTML5 parser）比 BS4 快 10~20x；沒裝時退回純標準庫的 html.parser
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# ✅ orjson（C 實作）序列化快 5~10x；沒裝時退回內建 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(b: bytes):
+    return orjson.loads(b) if orjson is not None else json.loads(b)
+
+def json_dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
 
 # 你要的四檔（用「表格上的契約名稱」做精準比對）
-TARGETS = [
-    {"ticker": "2330", "name": "台積電期貨", "contract": "台積電期貨"},
-    {"ticker": "2317", "name": "鴻海期貨",   "contract": "鴻海期貨"},
-    {"ticker": "3231", "name": "緯創期貨",   "contract": "緯創期貨"},
-    {"ticker": "2382", "name": "廣達期貨",   "contract": "廣達期貨"},
-]
+# frozen+slots：不可變、省每個實例的 __dict__，屬性取值也比 dict 查 key 直接
+@dataclass(frozen=True, slots=True)
+class Target:
+    ticker: str
+    name: str
+    contract: str
+
+TARGETS = (
+    Target("2330", "台積電期貨", "台積電期貨"),
+    Target("2317", "鴻海期貨",   "鴻海期貨"),
+    Target("3231", "緯創期貨",   "緯創期貨"),
+    Target("2382", "廣達期貨",   "廣達期貨"),
+)
 
 # ✅ 改抓「靜態表」：不需要 JS、不需要下拉選單參數
 TAIFEX_TBL_URL = "https://www.taifex.com.tw/cht/3/largeTraderFutQryTbl"
 
+# 上次抓到的 ETag / Last-Modified（跟著 repo 一起 commit，CI 換 runner 也帶得走）
+HTTP_CACHE_FILE = "docs/_table_cache.json"
+
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 
+TZ_TW = timezone(timedelta(hours=8))
+
+# ✅ 共用一條 TCP+TLS 連線（keep-alive）：之後要多打幾次 taifex 都不用重握手
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+# ✅ 熱路徑上的 regex 先編譯好（每格都會跑，不要每次走 re 模組的 cache 查表）
+_INT_RE = re.compile(r"-?\d[\d,]*")
+_WS_RE = re.compile(r"\s+")
+_DATE_RE = re.compile(rb"\d{4}/\d{2}/\d{2}")  # 直接掃 bytes，整頁不用先 decode
+_YM_RE = re.compile(r"^\d{4}\s*\d{2}")
+
+# 「所有契約」的 UTF-8 bytes，給原始 body 做字串掃描用
+_MARKER = "所有契約".encode("utf-8")
+
 def first_int(text: str) -> int:
-    m = re.search(r"[-\d,]+", text or "")
+    m = _INT_RE.search(text or "")
     return int(m.group(0).replace(",", "")) if m else 0
 
-def norm_cell(el) -> str:
-    return re.sub(r"\s+", " ", el.get_text(" ", strip=True))
+def norm_text(s: str) -> str:
+    return _WS_RE.sub(" ", s or "").strip()
+
+# 每列先給整列文字（一次走訪），個別 cell 的文字留到真的要用才取
+# 只會用到 index 0~9，後面的 cell 連 text 都不用取
+def _cols_lexbor(tr):
+    return [norm_text(c.text()) for c in tr.css("th,td")[:10]]
+
+def _cols_ready(cols):
+    return cols
+
+def _table_rows_lexbor(html: str):
+    tree = LexborHTMLParser(html)
+    table = tree.css_first("table.table_f")
+    if table is None:
+        return []
+    rows = []
+    for tr in table.css("tr"):
+        row_text = norm_text(tr.text())
+        if row_text:
+            rows.append((row_text, partial(_cols_lexbor, tr)))
+    return rows
+
+class _TableTextParser(HTMLParser):
+    # 純標準庫的備援：只收 table_f 裡每列的 (整列文字, cells)，約 30 行、不用裝任何套件
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []      # [(row_text, get_cols), ...]
+        self._depth = 0     # 進到 table_f 之後的巢狀 table 深度；0 = 還沒進到目標表
+        self._cells = None  # 目前這列收到的 cell 文字
+        self._buf = None    # 目前這格的文字片段
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            if self._depth:
+                self._depth += 1
+            elif any(k == "class" and "table_f" in (v or "") for k, v in attrs):
+                self._depth = 1
+            return
+        if not self._depth:
+            return
+        if tag == "tr":
+            self._flush_row()
+            self._cells = []
+        elif tag in ("td", "th") and self._cells is not None:
+            self._flush_cell()
+            self._buf = []
+
+    def handle_endtag(self, tag):
+        if not self._depth:
+            return
+        if tag in ("td", "th"):
+            self._flush_cell()
+        elif tag == "tr":
+            self._flush_row()
+        elif tag == "table":
+            self._flush_row()
+            self._depth -= 1
+
+    def handle_data(self, data):
+        if self._buf is not None:
+            self._buf.append(data)
+
+    def _flush_cell(self):
+        if self._buf is not None:
+            self._cells.append("".join(self._buf))
+            self._buf = None
 
-def fetch_table_html(timeout=25) -> str:
-    r = requests.get(TAIFEX_TBL_URL, headers=HEADERS, timeout=timeout)
-    r.encoding = "utf-8"
-    return r.text
+    def _flush_row(self):
+        if self._cells is None:
+            return
+        self._flush_cell()
+        cells = self._cells
+        self._cells = None
+        row_text = norm_text(" ".join(cells))
+        if row_text:
+            cols = [norm_text(c) for c in cells[:10]]
+            self.rows.append((row_text, partial(_cols_ready, cols)))
 
-def parse_targets(html: str):
-    soup = BeautifulSoup(html, "lxml")
-    table = soup.find("table", class_="table_f")
-    if not table:
-        return None, {t["contract"]: {"error": "找不到 TAIFEX 表格(table_f)"} for t in TARGETS}
+def _table_rows_stdlib(html: str):
+    p = _TableTextParser()
+    p.feed(html)
+    p.close()
+    return p.rows
+
+def table_slice(buf: bytes) -> bytes:
+    # ✅ 先在 bytes 上框出 table_f 的範圍，只把這一小段丟給 parser（整頁 ~100KB → 表格幾 KB）
+    idx = buf.find(b"table_f")
+    if idx == -1:
+        return b""
+    start = buf.rfind(b"<table", 0, idx)
+    end = buf.find(b"</table>", idx)
+    if start == -1 or end == -1:
+        return b""
+    return buf[start:end + len(b"</table>")]
+
+def table_rows(html: str):
+    if LexborHTMLParser is not None:
+        try:
+            rows = _table_rows_lexbor(html)
+            if rows:
+                return rows
+        except Exception:
+            pass  # 版面異常時退回標準庫 parser 再試一次
+    return _table_rows_stdlib(html)
+
+def load_http_cache() -> dict:
+    try:
+        with open(HTTP_CACHE_FILE, "rb") as f:
+            c = json_loads(f.read())
+        return c if isinstance(c, dict) else {}
+    except Exception:
+        return {}
+
+def save_http_cache(headers) -> None:
+    etag = headers.get("ETag")
+    lm = headers.get("Last-Modified")
+    if not etag and not lm:
+        return  # server 沒給快取標頭就不用留檔
+    os.makedirs("docs", exist_ok=True)
+    tmp = HTTP_CACHE_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(json_dumps({"etag": etag, "last_modified": lm}))
+    os.replace(tmp, HTTP_CACHE_FILE)
+
+def fetch_table_html(timeout=25, retries=4) -> bytes | None:
+    # ✅ 帶上次的 ETag/Last-Modified 做條件式請求：server 回 304 就是零 body、零解析
+    cond = {}
+    cache = load_http_cache()
+    if cache.get("etag"):
+        cond["If-None-Match"] = cache["etag"]
+    if cache.get("last_modified"):
+        cond["If-Modified-Since"] = cache["last_modified"]
+
+    # ✅ 429/5xx 或連線失敗時指數退避重試（1s→2s→4s）；正常情況一發就中、不用等
+    for attempt in range(retries):
+        try:
+            r = SESSION.get(TAIFEX_TBL_URL, headers=cond, timeout=timeout)
+        except requests.RequestException:
+            if attempt == retries - 1:
+                raise
+            time.sleep(2 ** attempt)
+            continue
+        if r.status_code == 304:
+            return None  # 頁面沒變，今天不用更新
+        if r.status_code == 429 or r.status_code >= 500:
+            if attempt == retries - 1:
+                r.raise_for_status()
+            time.sleep(2 ** attempt)
+            continue
+        save_http_cache(r.headers)
+        # ✅ 回傳原始 bytes：不把整頁 decode 成 r.text，後面只 decode 表格那一小段
+        return r.content
+
+def parse_targets(buf: bytes):
+    # ✅ 便宜的 bytes 掃描先行：整頁連「所有契約」都沒有，就不用啟動 parser
+    if _MARKER not in buf:
+        return None, {t.contract: {"error": "頁面上沒有『所有契約』列（可能當日尚未出或查無資料）"} for t in TARGETS}
+
+    # ✅ 解析是整支腳本唯一吃 CPU 的地方：只 decode + parse 表格片段，走訪全部留在 C 層
+    frag = table_slice(buf) or buf
+    rows = table_rows(frag.decode("utf-8", "replace"))
+    if not rows:
+        return None, {t.contract: {"error": "找不到 TAIFEX 表格(table_f)"} for t in TARGETS}
 
     # 從頁面抓日期（YYYY/MM/DD）
-    m = re.search(r"\d{4}/\d{2}/\d{2}", html)
-    date_ymd = m.group(0) if m else ""
+    m = _DATE_RE.search(buf)
+    date_ymd = m.group(0).decode("ascii") if m else ""
     date_s = date_ymd.replace("/", "") if date_ymd else ""
 
-    want = {t["contract"] for t in TARGETS}
+    want = frozenset(t.contract for t in TARGETS)
     found = {}  # contract -> data
     current_contract = None
 
-    rows = table.find_all("tr")
-    for tr in rows:
-        cells = tr.find_all(["th", "td"])
-        if not cells:
-            continue
-        cols = [norm_cell(c) for c in cells]
-        if not cols:
-            continue
+    for row_text, get_cols in rows:
 
+        # 整列文字掃一次就分流；沒中的列連 cell 都不用拆
         # 新契約段落開始：第一欄含「期貨」，但不是「所有契約」，也不是年月列
-        if (
-            "期貨" in cols[0]
-            and "所有" not in cols[0]
-            and not re.match(r"^\d{4}\s*\d{2}", cols[0])
-        ):
-            current_contract = cols[0]
+        if "期貨" in row_text and "所有契約" not in row_text:
+            cols = get_cols()
+            if (
+                cols
+                and "期貨" in cols[0]
+                and "所有" not in cols[0]
+                and not _YM_RE.match(cols[0])
+            ):
+                current_contract = cols[0]
+            continue
 
         # 「所有契約」那列（contract 名稱通常靠 rowspan 在上一列，所以要用 current_contract）
-        if any(("所有" in x and "契約" in x) for x in cols):
+        if "所有契約" in row_text:
             if current_contract in want and current_contract not in found:
+                cols = get_cols()
                 # 這列固定長這樣：
                 # [0]=所有契約
                 # [1]=買方前五(部位數+括號)
@@ -73,11 +272,7 @@ def parse_targets(html: str):
                     found[current_contract] = {"error": f"表格欄位不足(len={len(cols)})"}
                     continue
 
-                t5b = first_int(cols[1])
-                t10b = first_int(cols[3])
-                t5s = first_int(cols[5])
-                t10s = first_int(cols[7])
-                oi = first_int(cols[9])
+                t5b, t10b, t5s, t10s, oi = (first_int(cols[i]) for i in (1, 3, 5, 7, 9))
 
                 found[current_contract] = {
                     "top5": {"buy": t5b, "sell": t5s, "net": t5b - t5s},
@@ -88,7 +283,7 @@ def parse_targets(html: str):
 
     # 沒抓到的補 error
     for t in TARGETS:
-        c = t["contract"]
+        c = t.contract
         if c not in found:
             found[c] = {"error": "找不到該契約的『所有契約』列（可能當日尚未出或版面變動）"}
 
@@ -97,14 +292,17 @@ def parse_targets(html: str):
 def main():
     # ✅ 日期不靠自己推算，直接以 TAIFEX 表上顯示的日期為準
     html = fetch_table_html()
+    if html is None:
+        print("TAIFEX 回 304：頁面沒更新，跳過這次執行")
+        return
     date_s, found = parse_targets(html)
 
     items = []
     for t in TARGETS:
-        c = t["contract"]
+        c = t.contract
         items.append({
-            "ticker": t["ticker"],
-            "name": t["name"],
+            "ticker": t.ticker,
+            "name": t.name,
             "data": found.get(c, {"error": "未知錯誤"})
         })
 
@@ -112,33 +310,49 @@ def main():
 
 
   # --- 近 30 日累積（history）---
-    tz_tw = timezone(timedelta(hours=8))
-    today = date_s or datetime.now(tz_tw).strftime("%Y%m%d")
+    # ✅ 整個 run 只取一次現在時間（腳本跑不到一分鐘，一個 timestamp 就夠）
+    now_tw = datetime.now(TZ_TW)
+    today = date_s or now_tw.strftime("%Y%m%d")
     snapshot = {"date": today, "items": items}
 
     history_file = "docs/futures_data.json"
     history = []
+    old = None
     if os.path.exists(history_file):
         try:
-            with open(history_file, "r", encoding="utf-8") as f:
-                old = json.load(f)
+            with open(history_file, "rb") as f:
+                old = json_loads(f.read())
             history = old.get("history", [])
         except Exception:
+            old = None
             history = []
 
-    # 去重（同一天只留最新一筆）
-    history = [h for h in history if isinstance(h, dict) and h.get("date") != today]
-    history.insert(0, snapshot)
-    history = history[:30]
+    # 去重（同一天只留最新一筆）+ 上限 30 筆：deque 左插 O(1)、滿了自動淘汰最舊
+    hist = deque(
+        (h for h in history if isinstance(h, dict) and h.get("date") != today),
+        maxlen=30,
+    )
+    hist.appendleft(snapshot)
+    history = list(hist)
 
-    out["update_time"] = datetime.now(tz_tw).isoformat(timespec="seconds")
+    out["update_time"] = now_tw.isoformat(timespec="seconds")
     out["history"] = history
 
+    # ✅ 內容沒變就不重寫（只差 update_time 不算變）：假日/重跑時少一次磁碟寫入與 commit
+    if isinstance(old, dict):
+        strip = lambda d: {k: v for k, v in d.items() if k != "update_time"}
+        if strip(out) == strip(old):
+            print("資料沒變，跳過寫檔")
+            return
+
     # ⚠️ 輸出位置要跟你的 index.html 同資料夾
     # 如果你的 GitHub Pages 是用 /docs 當來源：就維持 docs/
+    # ✅ 先寫 .tmp 再 os.replace：中途掛掉也不會留半截 JSON 給 Pages 吃
     os.makedirs("docs", exist_ok=True)
-    with open("docs/futures_data.json", "w", encoding="utf-8") as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
+    tmp = history_file + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(json_dumps(out))
+    os.replace(tmp, history_file)
 
 if __name__ == "__main__":
     main()